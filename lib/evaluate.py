@@ -1,4 +1,4 @@
-from typing import Tuple, Union
+from typing import List, Tuple, Union
 from collections import defaultdict
 
 import torch
@@ -25,25 +25,33 @@ def compute_iou_(a, b):
     return IoU
 
 
-def compute_iou(box, boxes, box_area, boxes_area):
-    y1 = np.maximum(box[0], boxes[:, 0])
-    y2 = np.minimum(box[2], boxes[:, 2])
-    x1 = np.maximum(box[1], boxes[:, 1])
-    x2 = np.minimum(box[3], boxes[:, 3])
-    intersection = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
-    union = box_area + boxes_area[:] - intersection[:]
-    iou = intersection / union
-    return iou
+def compute_overlaps(boxes1, boxes2, out=None):
+    """Compute IoU between every pair of boxes1 and boxes2 in float32.
 
+    :param out: optional float32 scratch of shape (2, N, M, 2), the result is then a view of it
+    :return: overlaps of shape (N, M)
+    """
+    shape = (np.size(boxes1, 0), np.size(boxes2, 0))
+
+    if boxes1.size == 0 or boxes2.size == 0:
+        return np.zeros(shape, dtype=np.float32)
+
+    tl, br = np.empty((2, *shape, 2), dtype=np.float32) if out is None else out
+    boxes1, boxes2 = boxes1.astype(np.float32, copy=False), boxes2.astype(np.float32, copy=False)
 
-def compute_overlaps(boxes1, boxes2):
     area1 = (boxes1[:, 2] - boxes1[:, 0]) * (boxes1[:, 3] - boxes1[:, 1])
     area2 = (boxes2[:, 2] - boxes2[:, 0]) * (boxes2[:, 3] - boxes2[:, 1])
 
-    overlaps = np.zeros((boxes1.shape[0], boxes2.shape[0]))
-    for i in range(overlaps.shape[1]):
-        overlaps[:, i] = compute_iou(boxes2[i], boxes1, area2[i], area1)
-    return overlaps
+    np.maximum(boxes1[:, None, :2], boxes2[:, :2], out=tl)
+    np.minimum(boxes1[:, None, 2:], boxes2[:, 2:], out=br)
+    wh = np.clip(np.subtract(br, tl, out=br), 0, None, out=br)
+
+    # corners are consumed, reuse them for intersection and union
+    intersection, union = tl[..., 0], tl[..., 1]
+    np.multiply(wh[..., 0], wh[..., 1], out=intersection)
+    np.subtract(np.add(area1[:, None], area2, out=union), intersection, out=union)
+
+    return np.divide(intersection, union, out=intersection)
 
 
 class Evaluator:
@@ -53,12 +61,43 @@ class Evaluator:
         self.patch = np.linspace(0, 1, sample_patch)
         self.threshold = threshold
         self.distribution = distribution
-        self.center_total = np.empty((0, 2), dtype=np.int)
-        self.center_positive = np.empty((0, 2), dtype=np.int)
+        self.center_total = np.empty((0, 2), dtype=np.int32)
+        self.center_positive = np.empty((0, 2), dtype=np.int32)
 
-        self.TP, self.FP, self.FN = np.zeros((3, sample_patch, num_classes), dtype=np.uint32)
+        self.TP, self.FP, self.FN = np.zeros((3, num_classes, sample_patch), dtype=np.uint32)
         self.gt_counts, self.pd_counts = np.zeros((2, num_classes), dtype=np.uint32)
 
+        # overlap scratch, grown to the largest frame seen and reused across updates
+        self._buffer = None
+
+    @classmethod
+    def merge(cls, evaluators: List['Evaluator']) \
+            -> 'Evaluator':
+        """Reduce evaluators updated on disjoint frames into one.
+
+        :param evaluators: evaluators sharing num_classes, sample_patch and threshold
+        :return: evaluator holding the summed counts
+        """
+        if not evaluators:
+            raise ValueError('Evaluators to merge must not be empty')
+
+        first, *rest = evaluators
+
+        for evaluator in rest:
+            if (evaluator.num_classes, np.size(evaluator.patch), evaluator.threshold) != \
+                    (first.num_classes, np.size(first.patch), first.threshold):
+                raise ValueError('Evaluators to merge must share num_classes, sample_patch and threshold')
+
+        merged = cls(first.num_classes, np.size(first.patch), first.threshold, first.distribution)
+
+        for attribute in ('TP', 'FP', 'FN', 'gt_counts', 'pd_counts'):
+            setattr(merged, attribute, np.sum([getattr(e, attribute) for e in evaluators], axis=0, dtype=np.uint32))
+
+        for attribute in ('center_total', 'center_positive'):
+            setattr(merged, attribute, np.concatenate([getattr(e, attribute) for e in evaluators]))
+
+        return merged
+
     def update(self, predictions: Tuple[np.ndarray, Union[np.ndarray, None], np.ndarray, Union[np.ndarray, None]],
                groundtruths: Tuple[np.ndarray, np.ndarray, Union[np.ndarray, None]]) \
             -> None:
@@ -74,67 +113,111 @@ class Evaluator:
         if pd_scores is None:
             pd_scores = np.ones_like(pd_class_ids)
 
-        if pd_bboxes.size > 0:
-            iou = self.compute_iou(pd_bboxes, gt_bboxes, self.threshold)
-        else:
-            iou = np.empty((0, 0))
+        iou = self.compute_iou(pd_bboxes, gt_bboxes, self.threshold)
+
+        gt_numbers = np.bincount(gt_class_ids, minlength=self.num_classes)[:self.num_classes].astype(np.uint32)
+        pd_numbers = np.bincount(pd_class_ids, minlength=self.num_classes)[:self.num_classes].astype(np.uint32)
+
+        self.gt_counts += gt_numbers
+        self.pd_counts += pd_numbers
 
-        for klass in range(self.num_classes):
-            gt_number = np.sum(gt_class_ids == klass)
+        # order predictions by class, then by descending score,
+        # so each (class, patch) threshold is a prefix of its class segment
+        order = np.lexsort((-pd_scores, pd_class_ids))
+        class_ids, scores = pd_class_ids[order], pd_scores[order]
+        n_patch = np.size(self.patch)
 
-            self.gt_counts[klass] += gt_number
-            self.pd_counts[klass] += (pd_class_ids == klass).sum()
+        # first sorted row of each class segment, looked up per class and per row
+        class_starts = np.searchsorted(class_ids, np.arange(self.num_classes))
+        row_starts = np.searchsorted(class_ids, class_ids)
 
-            for p, patch in enumerate(self.patch):
-                pd_mask = np.logical_and(pd_class_ids == klass, pd_scores >= patch)
-                pd_number = np.sum(pd_mask)
+        # predictions only match ground truths of their own class
+        matches = iou[order] & (class_ids[:, None] == gt_class_ids)
 
-                if pd_number == 0:
-                    self.FN[p][klass] += gt_number
-                    continue
+        # running matches per ground truth, row r holds the matches of sorted rows [0, r)
+        matched = np.cumsum(matches, axis=0)
+        matched = np.vstack((np.zeros((1, np.size(matches, 1)), dtype=matched.dtype), matched))
 
-                # X, Y distribution store
-                if self.distribution:
-                    boxes = pd_bboxes * 100
-                    centers = np.stack((boxes[:, ::2].mean(-1), boxes[:, 1::2].mean(-1))).T.astype(np.int)
-                    self.center_total = np.concatenate((self.center_total, centers))
-                    self.center_positive = np.concatenate((self.center_positive, centers[pd_mask]))
+        # ground truths hit by rows [segment start, r], i.e. by each prefix of a class segment
+        prefix_hits = np.sum(matched[1:] - matched[row_starts] > 0, axis=1)
 
-                true_positive = np.sum(iou[pd_mask][:, gt_class_ids == klass].any(axis=0))
+        # shift by one, so index start + count reads a prefix of count rows and an empty prefix reads 0
+        prefix_hits = np.pad(prefix_hits, (1, 0))
 
-                self.TP[p][klass] += true_positive
-                self.FP[p][klass] += pd_number - true_positive
-                self.FN[p][klass] += gt_number - true_positive
+        # predictions surviving each patch threshold, counted per flattened (class, patch) cell
+        survive = scores[:, None] >= self.patch
+        cells = class_ids[:, None] * n_patch + np.arange(n_patch)
+        counts = np.bincount(cells[survive], minlength=self.TP.size)
 
-    @staticmethod
-    def compute_iou(tar_boxes: np.ndarray, src_boxes: np.ndarray, threshold: float) \
+        # cells of class ids past num_classes lie beyond TP.size and are dropped
+        counts = counts[:self.TP.size].reshape(self.num_classes, n_patch)
+
+        true_positive = np.where(counts > 0, prefix_hits[class_starts[:, None] + counts], 0)
+
+        # compute_iou matches each prediction to at most one ground truth,
+        # which keeps the unsigned FP and FN increments from wrapping around
+        assert np.all(true_positive <= counts) and np.all(true_positive <= gt_numbers[:, None]), \
+            'a prediction matched more than one ground truth'
+
+        self.TP += true_positive.astype(np.uint32)
+        self.FP += (counts - true_positive).astype(np.uint32)
+        self.FN += (gt_numbers[:, None] - true_positive).astype(np.uint32)
+
+        # X, Y distribution store
+        if self.distribution:
+            boxes = pd_bboxes * 100
+            centers = np.stack((boxes[:, ::2].mean(-1), boxes[:, 1::2].mean(-1))).T.astype(np.int32)
+
+            # every (class, patch) keeping a prediction stores all centers, and the centers it kept
+            *_, kept = np.nonzero((pd_class_ids == np.arange(self.num_classes)[:, None, None]) &
+                                  (pd_scores >= self.patch[:, None]))
+            self.center_total = np.concatenate((self.center_total, np.tile(centers, (np.count_nonzero(counts), 1))))
+            self.center_positive = np.concatenate((self.center_positive, centers[kept]))
+
+    def compute_iou(self, tar_boxes: np.ndarray, src_boxes: np.ndarray, threshold: float) \
+            -> np.ndarray:
+        iou = self.compute_overlaps(tar_boxes, src_boxes)
+
+        if not iou.size:
+            return np.zeros(iou.shape, dtype=bool)
+
+        # exactly one match per prediction, argmax breaks ties (e.g. duplicated ground truths) to the first
+        best = np.arange(np.size(iou, 1)) == iou.argmax(axis=1)[:, None]
+
+        # only the kept column can match, so threshold the row maximum instead of the whole matrix
+        return best & (iou.max(axis=1, keepdims=True) >= threshold)
+
+    def compute_overlaps(self, boxes1: np.ndarray, boxes2: np.ndarray) \
             -> np.ndarray:
-        iou = compute_overlaps(tar_boxes, src_boxes) >= threshold
-        axis, argm = np.arange(np.size(iou, 0)), iou.argmax(axis=1)
-        outputs = np.zeros_like(iou)
-        outputs[axis, argm] = iou[axis, argm]
-        return outputs >= threshold
+        """compute_overlaps written into the evaluator scratch buffers.
+
+        :return: overlaps view of the scratch buffers, valid until the next call
+        """
+        shape = (np.size(boxes1, 0), np.size(boxes2, 0))
+
+        if self._buffer is None or np.any(np.greater(shape, self._buffer.shape[1:3])):
+            size = shape if self._buffer is None else np.maximum(shape, self._buffer.shape[1:3])
+            self._buffer = np.empty((2, *size, 2), dtype=np.float32)
+
+        return compute_overlaps(boxes1, boxes2, out=self._buffer[:, :shape[0], :shape[1]])
 
     @property
     def precision(self) \
             -> np.ndarray:
-        return np.nan_to_num(self.TP / (self.TP + self.FP)).mean(axis=0)
+        return np.nan_to_num(self.TP / (self.TP + self.FP)).mean(axis=1)
 
     @property
     def recall(self) \
             -> np.ndarray:
-        return np.nan_to_num(self.TP / (self.TP + self.FN)).mean(axis=0)
+        return np.nan_to_num(self.TP / (self.TP + self.FN)).mean(axis=1)
 
     @property
     def mAP(self) \
             -> np.ndarray:
-        prev_recall, ap = np.zeros((2, self.num_classes))
-
-        for precision, recall in zip(self.precision[::-1], self.recall[::-1]):
-            ap += precision * (recall - prev_recall)
-            prev_recall = recall
+        precision, recall = self.precision[::-1], self.recall[::-1]
+        ap = np.sum(precision * np.diff(recall, prepend=0.))
 
-        return ap
+        return np.full(self.num_classes, ap)
 
     def dump(self) \
             -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
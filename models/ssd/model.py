@@ -1,7 +1,6 @@
 import re
 from typing import List, Iterable, Tuple, Union
-from functools import reduce
-from itertools import chain
+from itertools import chain, accumulate, islice
 
 import torch
 import torch.nn as nn
@@ -77,7 +76,11 @@ class SSD(Model):
 
         self.features = backbone
         self.appendix = appendix
-        self.priors = PriorBox(**self.config.dump).forward()
+        priorbox = PriorBox(**self.config.dump)
+        priors = priorbox.forward()
+        # non-persistent buffer: follows .to()/.cuda() and replicas, stays out of state dicts
+        self.register_buffer('priors', priors.half() if self.config.half_priors else priors, persistent=False)
+        self.offsets = list(zip(accumulate([0, *priorbox.counts[:-1]]), accumulate(priorbox.counts)))
         self.extras, self.loc, self.conf = map(nn.ModuleList, (extras, loc, conf))
 
         for _, layer, name in self.appendix:
@@ -98,6 +101,8 @@ class SSD(Model):
 
             confidences = F.softmax(confidences, dim=-1)
             num_priors = prior_boxes.size(0)
+            # priors may be stored in half precision, decode in the prediction precision
+            prior_boxes = prior_boxes.to(locations.dtype)
 
             output = torch.zeros(self.batch_size, self.num_classes, self.config.nms_top_k, 5) \
                 if self.config.nms else None
@@ -171,10 +176,6 @@ class SSD(Model):
                     2: localization layers, Shape: [batch, num_priors*4]
                     3: priorbox layers, Shape: [2, num_priors*4]
         """
-        def _forward(tensor: torch.Tensor, module: nn.Module) \
-                -> torch.Tensor:
-            return module.forward(tensor)
-
         if self.warping == 'first':
             x = Warping.forward(x, self.warping_mode)
 
@@ -182,7 +183,8 @@ class SSD(Model):
 
         # forward layers for extract sources
         for index, layer, *_ in self.appendix:
-            x = reduce(_forward, [x, *self.features[start:index]])
+            for module in islice(self.features, start, index):
+                x = module(x)
 
             if isinstance(layer, GraphPath):
                 x, y = layer(x, self.features[index])
@@ -198,34 +200,30 @@ class SSD(Model):
             start = index
 
         # forward remain parts
-        x = reduce(_forward, [x, *self.features[start:]])
+        for module in islice(self.features, start, None):
+            x = module(x)
 
-        for i, layer in enumerate(self.extras):
-            x = _forward(x, layer)
+        for layer in self.extras:
+            x = layer(x)
             sources.append(x)
 
         if self.warping == 'all':
-            sources = list(map(lambda s: Warping.forward(s, self.warping_mode), sources))
+            sources = [Warping.forward(source, self.warping_mode) for source in sources]
 
         elif self.warping == 'head':
             sources[0] = Warping.forward(sources[0], self.warping_mode)
             sources[1] = Warping.forward(sources[1], self.warping_mode)
 
-        def refine(source: torch.Tensor) \
-                -> torch.Tensor:
-            return source.permute(0, 2, 3, 1).contiguous()
-
-        def reshape(tensor: torch.Tensor) \
-                -> torch.Tensor:
-            return torch.cat(tuple(map(lambda t: t.view(t.size(0), -1), tensor)), 1)
-
-        locations, confidences = map(reshape, zip(*[(refine(loc(source)), refine(conf(source)))
-                                                    for source, loc, conf in zip(sources, self.loc, self.conf)]))
+        # write each head straight into its prior range, no per-source contiguous copy and cat
+        batch, (num_priors, _) = x.size(0), self.priors.shape
+        locations = x.new_empty(batch, num_priors, 4)
+        confidences = x.new_empty(batch, num_priors, self.num_classes)
 
-        locations = locations.view(self.batch_size, -1, 4)
-        confidences = confidences.view(self.batch_size, -1, self.num_classes)
+        for (start, end), source, loc, conf in zip(self.offsets, sources, self.loc, self.conf):
+            locations[:, start:end] = loc(source).permute(0, 2, 3, 1).reshape(batch, -1, 4)
+            confidences[:, start:end] = conf(source).permute(0, 2, 3, 1).reshape(batch, -1, self.num_classes)
 
-        output = (locations, confidences, self.priors.to(x.device))
+        output = (locations, confidences, self.priors)
 
         if not self.training:
             output = self.detect(*output).to(x.device)
@@ -333,10 +331,10 @@ class VGG16(SSD):
         for mid_channels, out_channels, option in cls.EXTRAS:
             yield nn.Sequential(
                 nn.Conv2d(in_channels=in_channels, out_channels=mid_channels, kernel_size=1),
-                nn.ReLU(),
+                nn.ReLU(inplace=True),
                 nn.Conv2d(in_channels=mid_channels, out_channels=out_channels, kernel_size=3,
                           stride=1 + option, padding=option),
-                nn.ReLU(),
+                nn.ReLU(inplace=True),
             )
             in_channels = out_channels
 
@@ -372,10 +370,10 @@ class MOBILENET1(SSD):
         for mid_channels, out_channels, option in cls.EXTRAS:
             yield nn.Sequential(
                 nn.Conv2d(in_channels=in_channels, out_channels=mid_channels, kernel_size=1),
-                nn.ReLU(),
+                nn.ReLU(inplace=True),
                 nn.Conv2d(in_channels=mid_channels, out_channels=out_channels, kernel_size=3,
                           stride=1 + option, padding=option),
-                nn.ReLU(),
+                nn.ReLU(inplace=True),
             )
             in_channels = out_channels
 
@@ -431,7 +429,7 @@ class MOBILENET1_LITE(SSD):
         for mid_channels, out_channels, option in cls.EXTRAS:
             yield nn.Sequential(
                 nn.Conv2d(in_channels=in_channels, out_channels=mid_channels, kernel_size=1),
-                nn.ReLU(),
+                nn.ReLU(inplace=True),
                 cls.SeperableConv2d(in_channels=mid_channels, out_channels=out_channels, kernel_size=3,
                                     stride=1 + option, padding=option),
             )
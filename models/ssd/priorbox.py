@@ -41,6 +41,21 @@ class PriorBox(object):
         if any(filter(lambda x: x <= 0, self.variance)):
             raise ValueError('Variances must be greater than 0')
 
+    @property
+    def counts(self) \
+            -> List[int]:
+        """Number of priors generated for each source feature map, in forward order.
+        """
+        counts = []
+
+        for spec in self.config:
+            feat_size = spec.feature_map_size
+            feat_size = feat_size if isinstance(feat_size, Iterable) else (feat_size, feat_size)
+
+            counts.append(int(np.prod(feat_size)) * (2 + 2 * len(spec.aspect_ratios)))
+
+        return counts
+
     def forward(self):
         priors = []
 
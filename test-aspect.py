@@ -113,12 +113,12 @@ def test_aspect(model: nn.Module, dataset: Dataset,
                     continue
 
                 evaluator.update((
-                    detection[:, 0].astype(np.int),
-                    detection[:, 1].astype(np.float32),
-                    detection[:, 2:].astype(np.float32),
+                    detection[:, 0].astype(np.int32),
+                    detection[:, 1],
+                    detection[:, 2:],
                     None,
                 ), (
-                    target[:, -1].astype(np.int),
+                    target[:, -1].astype(np.int32),
                     target[:, :4].astype(np.float32),
                     None,
                 ))
@@ -155,7 +155,6 @@ def test_aspect(model: nn.Module, dataset: Dataset,
 
     if not args.eval_only:
         aps, precisions, recalls = [], [], []
-        gt_counts, pd_counts = 0, 0
 
         for klass, (ap, precision, recall) in enumerate(zip(*evaluator.dump())):
             # Skip BG class
@@ -169,8 +168,9 @@ def test_aspect(model: nn.Module, dataset: Dataset,
             aps.append(ap)
             precisions.append(precision)
             recalls.append(recall)
-            gt_counts += evaluator.gt_counts[klass]
-            pd_counts += evaluator.pd_counts[klass]
+
+        # Skip BG class
+        gt_counts, pd_counts = evaluator.gt_counts[1:].sum(), evaluator.pd_counts[1:].sum()
 
         print(f'mAP total: {np.mean(aps)}')
         print(f'\tPrecision: {np.mean(precisions)}, Recall: {np.mean(recalls)}')
@@ -1,6 +1,7 @@
 import json
 from typing import Iterator
 from pathlib import Path
+from multiprocessing import Pool
 
 from tqdm import tqdm
 import numpy as np
@@ -22,6 +23,8 @@ def arguments(args):
                       help="evaluate only, not detecting")
     args.add_argument('--overwrite', required=False, default=False, action='store_true',
                       help="overwrite previous result")
+    args.add_argument('--results-only', required=False, default=False, action='store_true',
+                      help="evaluate saved detections in dest, not detecting")
 
     args.add_argument('--distribution', required=False, default='', type=str,
                       help="Save figure distribution")
@@ -31,7 +34,8 @@ def init(model: nn.Module, device: torch.device,
          args: Arguments.parse.Namespace = None) \
         -> nn.Module:
 
-    model.load(torch.load(args.model, map_location=lambda s, l: s))
+    if not args.results_only:
+        model.load(torch.load(args.model, map_location=lambda s, l: s))
     model.eval()
 
     if device.type == 'cuda':
@@ -42,61 +46,115 @@ def init(model: nn.Module, device: torch.device,
     return model
 
 
+# shared with evaluate workers by fork, so the dataset is not pickled per chunk
+_evaluate_context = {}
+
+
+def _evaluate_init(dataset: Dataset, dest: Path, distribution: bool):
+    _evaluate_context.update(dataset=dataset, dest=dest, distribution=distribution)
+
+
+def evaluate(indices: np.ndarray) \
+        -> Evaluator:
+    """Evaluate saved detections of the given frames against their ground truths.
+
+    :param indices: dataset indices of the frames
+    :return: evaluator of the frames, reduce chunks with Evaluator.merge
+    """
+    dataset, dest = _evaluate_context['dataset'], _evaluate_context['dest']
+    evaluator = Evaluator(num_classes=dataset.num_classes, distribution=_evaluate_context['distribution'])
+
+    for index in indices:
+        destination = dest.joinpath(f'{dataset.pull_name(index)}.txt')
+
+        # frames without detections are saved as empty files
+        if not destination.stat().st_size:
+            continue
+
+        detection = np.loadtxt(str(destination), dtype=np.float32, delimiter=',', ndmin=2)
+        _, target = dataset[index]
+        target = np.asarray(target, dtype=np.float32)
+
+        if not target.size:
+            continue
+
+        evaluator.update((
+            detection[:, 0].astype(np.int32),
+            detection[:, 1],
+            detection[:, 2:],
+            None,
+        ), (
+            target[:, -1].astype(np.int32),
+            target[:, :4],
+            None,
+        ))
+
+    return evaluator
+
+
 def test(model: nn.Module, dataset: Dataset,
          device: torch.device = None, args: Arguments.parse.Namespace = None, **kwargs) \
         -> Iterator[dict]:
-    loader = data.DataLoader(dataset, args.batch, num_workers=args.worker,
-                             shuffle=False, collate_fn=Dataset.collate, pin_memory=True)
-    evaluator = Evaluator(num_classes=dataset.num_classes, distribution=bool(args.distribution))
     dest = Path(args.dest)
     result = {}
 
-    with tqdm(total=len(dataset)) as tq:
-        for index, (images, targets) in enumerate(iter(loader)):
-
-            images = Variable(images.to(device), requires_grad=False)
-            targets = [Variable(target.to(device), requires_grad=False) for target in targets]
-            outputs = model(images)
-
-            for batch_index, (output, target) in enumerate(zip(outputs, targets)):
-                name = dataset.pull_name(index * args.batch + batch_index)
-                destination = Path(dest).joinpath(f'{name}.txt')
-                detection = np.empty((0, 6), dtype=np.float32)
-                target = target.detach().cpu().numpy()
-
-                for klass, boxes in enumerate(output):
-                    candidates = boxes[boxes[:, 0] >= args.thresh]
-
-                    if candidates.size(0) == 0:
-                        continue
-
-                    detection = np.concatenate((
-                        detection,
-                        np.hstack((
-                            np.full((np.size(candidates, 0), 1), klass, dtype=np.uint8),
-                            candidates.cpu().detach().numpy(),
-                        )),
-                    ))
-
-                pd.DataFrame(detection).to_csv(str(destination), header=None, index=None)
-
-                if not args.eval_only:
-                    if not detection.size or not target.size:
-                        continue
-
-                    evaluator.update((
-                        detection[:, 0].astype(np.int),
-                        detection[:, 1].astype(np.float32),
-                        detection[:, 2:].astype(np.float32),
-                        None,
-                    ), (
-                        target[:, -1].astype(np.int),
-                        target[:, :4].astype(np.float32),
-                        None,
-                    ))
-
-            tq.set_postfix(mAP=evaluator.mAP.mean())
-            tq.update(args.batch)
+    if args.results_only:
+        chunks = np.array_split(np.arange(len(dataset)), max(args.worker, 1) * 4)
+
+        with Pool(max(args.worker, 1), _evaluate_init, (dataset, dest, bool(args.distribution))) as pool:
+            evaluator = Evaluator.merge(list(tqdm(pool.imap(evaluate, chunks), total=len(chunks))))
+
+    else:
+        loader = data.DataLoader(dataset, args.batch, num_workers=args.worker,
+                                 shuffle=False, collate_fn=Dataset.collate, pin_memory=True)
+        evaluator = Evaluator(num_classes=dataset.num_classes, distribution=bool(args.distribution))
+
+        with tqdm(total=len(dataset)) as tq:
+            for index, (images, targets) in enumerate(iter(loader)):
+
+                images = Variable(images.to(device), requires_grad=False)
+                targets = [Variable(target.to(device), requires_grad=False) for target in targets]
+                outputs = model(images)
+
+                for batch_index, (output, target) in enumerate(zip(outputs, targets)):
+                    name = dataset.pull_name(index * args.batch + batch_index)
+                    destination = Path(dest).joinpath(f'{name}.txt')
+                    detection = np.empty((0, 6), dtype=np.float32)
+                    target = target.detach().cpu().numpy()
+
+                    for klass, boxes in enumerate(output):
+                        candidates = boxes[boxes[:, 0] >= args.thresh]
+
+                        if candidates.size(0) == 0:
+                            continue
+
+                        detection = np.concatenate((
+                            detection,
+                            np.hstack((
+                                np.full((np.size(candidates, 0), 1), klass, dtype=np.uint8),
+                                candidates.cpu().detach().numpy(),
+                            )),
+                        ))
+
+                    pd.DataFrame(detection).to_csv(str(destination), header=None, index=None)
+
+                    if not args.eval_only:
+                        if not detection.size or not target.size:
+                            continue
+
+                        evaluator.update((
+                            detection[:, 0].astype(np.int32),
+                            detection[:, 1],
+                            detection[:, 2:],
+                            None,
+                        ), (
+                            target[:, -1].astype(np.int32),
+                            target[:, :4],
+                            None,
+                        ))
+
+                tq.set_postfix(mAP=evaluator.mAP.mean())
+                tq.update(args.batch)
 
     if args.distribution:
         from collections import Counter
@@ -127,7 +185,6 @@ def test(model: nn.Module, dataset: Dataset,
 
     if not args.eval_only:
         aps, precisions, recalls = [], [], []
-        gt_counts, pd_counts = 0, 0
 
         for klass, (ap, precision, recall) in enumerate(zip(*evaluator.dump())):
             # Skip BG class
@@ -141,8 +198,9 @@ def test(model: nn.Module, dataset: Dataset,
             aps.append(ap)
             precisions.append(precision)
             recalls.append(recall)
-            gt_counts += evaluator.gt_counts[klass]
-            pd_counts += evaluator.pd_counts[klass]
+
+        # Skip BG class
+        gt_counts, pd_counts = evaluator.gt_counts[1:].sum(), evaluator.pd_counts[1:].sum()
 
         print(f'mAP total: {np.mean(aps)}')
         print(f'\tPrecision: {np.mean(precisions)}, Recall: {np.mean(recalls)}')
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from lib.evaluate import Evaluator
+
+
+def test_duplicate_groundtruths_match_once():
+    evaluator = Evaluator(num_classes=2)
+
+    box = np.array([[0, 0, 1, 1]], dtype=np.float32)
+    evaluator.update((
+        np.array([1], dtype=np.int32),
+        np.array([.95], dtype=np.float32),
+        box,
+        None,
+    ), (
+        np.array([1, 1], dtype=np.int32),
+        np.repeat(box, 2, axis=0),
+        None,
+    ))
+
+    # one prediction hits one of the two identical ground truths, never both
+    assert evaluator.TP[1].max() == 1
+    assert evaluator.FP[1].max() == 0
+    assert np.all(evaluator.FN[1] >= 1)
+    assert evaluator.precision[1] <= 1
+
+
+def test_merge_matches_single_evaluator():
+    rng = np.random.default_rng(0)
+    whole, parts = Evaluator(num_classes=3), [Evaluator(num_classes=3) for _ in range(2)]
+
+    for index in range(20):
+        pd_boxes, gt_boxes = (np.hstack((xy, xy + .2)).astype(np.float32) for xy in rng.random((2, 5, 2)))
+        predictions = (rng.integers(0, 3, 5), rng.random(5).astype(np.float32), pd_boxes, None)
+        groundtruths = (rng.integers(0, 3, 5), gt_boxes, None)
+
+        whole.update(predictions, groundtruths)
+        parts[index % 2].update(predictions, groundtruths)
+
+    merged = Evaluator.merge(parts)
+
+    for attribute in ('TP', 'FP', 'FN', 'gt_counts', 'pd_counts'):
+        assert np.array_equal(getattr(merged, attribute), getattr(whole, attribute))
+
+
+def test_merge_rejects_mismatched_evaluators():
+    with pytest.raises(ValueError):
+        Evaluator.merge([])
+
+    with pytest.raises(ValueError):
+        Evaluator.merge([Evaluator(num_classes=2), Evaluator(num_classes=3)])
+
+    with pytest.raises(ValueError):
+        Evaluator.merge([Evaluator(num_classes=2), Evaluator(num_classes=2, sample_patch=5)])
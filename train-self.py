@@ -103,17 +103,17 @@ def generate_pseudo(model: nn.Module, dataset: Dataset, transform: Augmentation,
             ))
 
         if args.unlabeled_gt and groundtruth.exists():
-            gt = pd.read_csv(str(groundtruth), header=None).values
+            gt = np.loadtxt(str(groundtruth), dtype=np.float32, delimiter=',', ndmin=2)
 
             if detection.size and gt.size:
                 evaluator.update((
-                    detection[:, 0].astype(np.int),
-                    detection[:, 1].astype(np.float32),
-                    detection[:, 2:].astype(np.float32),
+                    detection[:, 0].astype(np.int32),
+                    detection[:, 1],
+                    detection[:, 2:],
                     None,
                 ), (
-                    np.ones(np.size(gt, 0), dtype=np.int),
-                    gt.astype(np.float32),
+                    np.ones(np.size(gt, 0), dtype=np.int32),
+                    gt,
                     None,
                 ))
 